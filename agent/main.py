@@ -1,6 +1,9 @@
 from os import getenv
+import asyncio
 import logging
+import profiler
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import Dict, Any
 from datetime import datetime
@@ -35,6 +38,12 @@ logging.warning(f"KNOWLEDGE_BASE_ID = {kb_id}")
 memory_id = getenv("MEMORY_ID")
 logging.warning(f"MEMORY_ID = {memory_id}")
 
+# requests to /debug/profile must send this token in an X-Debug-Token header
+profile_token = getenv("PROFILE_TOKEN", "")
+
+# seconds between samples of the always-on profiler (0 disables it)
+profile_continuous_interval = float(getenv("PROFILE_CONTINUOUS_INTERVAL", "0"))
+
 retry_config = Config(
     region_name=region,
     retries={
@@ -158,6 +167,52 @@ logging.getLogger("uvicorn.access").addFilter(NoHealthCheckFilter())
 async def ping():
     return {"status": "healthy"}
 
+
+continuous_profiler = None
+if profile_continuous_interval > 0:
+    continuous_profiler = profiler.Sampler(profile_continuous_interval).start()
+
+
+if continuous_profiler is not None:
+    @app.middleware("http")
+    async def tag_profiler_route(request: Request, call_next):
+        """tags continuous profiler samples with the route being handled"""
+        profiler.watch_loop(asyncio.get_running_loop())
+        token = profiler.route_var.set(f"{request.method} {request.url.path}")
+        try:
+            return await call_next(request)
+        finally:
+            profiler.route_var.reset(token)
+
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+async def debug_profile(request: Request, seconds: str = None, interval: str = None, mode: str = ""):
+    """
+    samples all threads for a number of seconds and returns a collapsed
+    stack profile, or with mode=continuous returns (and resets) the profile
+    collected by the always-on profiler
+    """
+    if not profiler.authorized(profile_token, request.headers.get("X-Debug-Token")):
+        raise HTTPException(status_code=403, detail="forbidden")
+
+    if mode == "continuous":
+        if continuous_profiler is None:
+            raise HTTPException(
+                status_code=404, detail="continuous profiling is not enabled")
+        return continuous_profiler.collapsed(reset=True)
+
+    try:
+        seconds = profiler.parse_duration(seconds, 10, 0.1, 60)
+        interval = profiler.parse_duration(interval, 0.01, 0.001, 1)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    sampler = profiler.Sampler(interval).start()
+    await asyncio.sleep(seconds)
+    sampler.stop()
+    return sampler.collapsed()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8080)
@@ -0,0 +1,138 @@
+import os
+import sys
+import hmac
+import math
+import time
+import asyncio
+import threading
+import contextvars
+from collections import Counter
+
+# thread id -> route currently being handled by that thread
+routes = {}
+
+# for asyncio apps, where many requests share one thread, the route is
+# tracked per task and looked up via the task running on a watched loop
+route_var = contextvars.ContextVar("profiler_route", default=None)
+
+# thread id -> event loop running on that thread
+loops = {}
+
+
+def set_route(route):
+    """tags samples taken from the current thread with a route"""
+    routes[threading.get_ident()] = route
+
+
+def clear_route():
+    routes.pop(threading.get_ident(), None)
+
+
+def watch_loop(loop):
+    """tags samples taken from a loop's thread with its running task's route_var"""
+    loops[threading.get_ident()] = loop
+
+
+def task_route(thread_id):
+    """returns the route of the task currently running on a watched loop"""
+    loop = loops.get(thread_id)
+    if loop is None:
+        return None
+    task = asyncio.current_task(loop)
+    if task is None:
+        return None
+    return task.get_context().get(route_var)
+
+
+def parse_duration(value, default, minimum, maximum):
+    """
+    parses a duration in seconds from a query string value, clamped to a
+    range. raises ValueError for values that aren't finite numbers.
+    """
+    seconds = default if value is None else float(value)
+    if not math.isfinite(seconds):
+        raise ValueError(f"invalid duration: {value}")
+    return min(max(seconds, minimum), maximum)
+
+
+def authorized(expected, supplied):
+    """
+    checks a supplied debug token against the configured one.
+    profiling is disabled when no token is configured.
+    """
+    if not expected or not supplied:
+        return False
+    return hmac.compare_digest(expected.encode(), supplied.encode())
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class Sampler():
+    """
+    Low overhead sampling profiler. A background thread periodically
+    captures the stack of every other thread and counts identical stacks,
+    which are returned in collapsed format (one "root;...;leaf count" line
+    per stack) for use with flamegraph tools.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.run, name="profiler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            self.sample(own)
+
+    def sample(self, own):
+        stacks = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            route = routes.get(thread_id) or task_route(thread_id)
+            if route is not None:
+                stack.append(route)
+            stacks.append(";".join(reversed(stack)))
+        with self.lock:
+            self.counts.update(stacks)
+            self.samples += 1
+
+    def collapsed(self, reset=False):
+        """returns the collected stacks in collapsed format"""
+        with self.lock:
+            lines = [f"{stack} {count}"
+                     for stack, count in self.counts.most_common()]
+            if reset:
+                self.counts.clear()
+                self.samples = 0
+        return "\n".join(lines) + "\n"
+
+
+def profile(seconds, interval):
+    """profiles all threads for a number of seconds (blocks the caller)"""
+    sampler = Sampler(interval).start()
+    time.sleep(seconds)
+    sampler.stop()
+    return sampler.collapsed()
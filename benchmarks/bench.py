@@ -0,0 +1,222 @@
+"""
+Microbenchmarks for the web tier's CPU bound hot paths, run against
+synthetic memory events of varying size.
+
+    python benchmarks/bench.py                      # run everything
+    python benchmarks/bench.py --filter markdown    # run matching benchmarks
+    python benchmarks/bench.py --json out.json      # save results
+    python benchmarks/bench.py --compare out.json   # fail on regressions
+"""
+import os
+import sys
+import json
+import random
+import timeit
+import argparse
+import statistics
+from datetime import datetime, timezone, timedelta
+
+# the app modules read their configuration and create aws clients at import
+os.environ.setdefault("AWS_REGION", "us-east-1")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AGENT_RUNTIME", "benchmark")
+os.environ.setdefault("MEMORY_ID", "benchmark-0000000000")
+# no exporters or spans, so only the code under test is measured
+os.environ["OTEL_SDK_DISABLED"] = "true"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import logging  # noqa: E402
+import database  # noqa: E402
+import main  # noqa: E402
+from chat_message import ChatMessage  # noqa: E402
+from flask import render_template  # noqa: E402
+
+logging.getLogger().setLevel(logging.WARNING)
+
+parser = argparse.ArgumentParser(description="Run web tier microbenchmarks")
+parser.add_argument("--filter", default="",
+                    help="only run benchmarks whose name contains this")
+parser.add_argument("--repeat", type=int, default=7,
+                    help="number of timing samples per benchmark")
+parser.add_argument("--min-time", type=float, default=0.2,
+                    help="minimum seconds per timing sample")
+parser.add_argument("--quick", action="store_true",
+                    help="only run the smallest fixture sizes")
+parser.add_argument("--json", help="write results to this file")
+parser.add_argument("--compare", help="compare against a previous --json file")
+parser.add_argument("--threshold", type=float, default=0.15,
+                    help="relative slowdown reported as a regression")
+
+ANSWER = ("The **knowledge base** says that `widgets` are configured in the "
+          "[admin console](https://example.com).\n\n"
+          "| setting | value |\n|---|---|\n| size | 10 |\n| color | ~~red~~ blue |\n\n"
+          "1. first step\n2. second step\n\n")
+
+
+def message(role, text):
+    """a message serialized the way strands stores it in memory"""
+    return json.dumps({"message": {"role": role.lower(), "content": [{"text": text}]}})
+
+
+def tool_message():
+    return json.dumps({"message": {"role": "assistant", "content": [
+        {"toolUse": {"toolUseId": "t1", "name": "retrieve", "input": {"text": "widgets"}}}]}})
+
+
+def events(session_id, turns, start):
+    """memory events for a conversation with a tool call per turn, newest first"""
+    result = []
+    ts = start
+    for turn in range(turns):
+        for role, text in (("USER", message("USER", f"question {turn} about widgets?")),
+                           ("ASSISTANT", tool_message()),
+                           ("ASSISTANT", message("ASSISTANT", ANSWER * 2))):
+            ts += timedelta(seconds=1)
+            result.append({
+                "eventId": f"{int(ts.timestamp())}#{turn:x}",
+                "sessionId": session_id,
+                "eventTimestamp": ts,
+                "payload": [{"conversational": {"role": role, "content": {"text": text}}}],
+            })
+    return list(reversed(result))
+
+
+class FakeMemoryClient():
+    """serves a single conversation for MemoryClient.list_events"""
+
+    def __init__(self, turns):
+        self.events = events("s0", turns, datetime(2025, 1, 1, tzinfo=timezone.utc))
+
+    def list_events(self, memory_id, actor_id, session_id):
+        return self.events
+
+
+class FakeMemoryDataClient():
+    """serves sessions for the boto3 list_sessions and list_events apis"""
+
+    def __init__(self, sessions):
+        rnd = random.Random(sessions)
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self.sessions = {}
+        for s in range(sessions):
+            # mix datetime and iso string timestamps as the api may return either
+            evs = events(f"s{s}", 2, start + timedelta(minutes=rnd.randrange(10**6)))
+            if s % 2:
+                for e in evs:
+                    e["eventTimestamp"] = e["eventTimestamp"].isoformat().replace("+00:00", "Z")
+            self.sessions[f"s{s}"] = evs
+
+    def list_sessions(self, memoryId, actorId):
+        return {"sessionSummaries": [{"sessionId": s} for s in self.sessions]}
+
+    def list_events(self, memoryId, actorId, sessionId, **kwargs):
+        return {"events": self.sessions[sessionId]}
+
+
+def bench_translate(turns):
+    """Database.get: memory events to question/answer translation"""
+    database.memory_client = FakeMemoryClient(turns)
+    db = database.Database()
+    return lambda: db.get("s0", "user-1")
+
+
+def bench_list_by_user(sessions):
+    """Database.list_by_user: session sorting and timestamp formatting"""
+    database.memory_data_client = FakeMemoryDataClient(sessions)
+    db = database.Database()
+    return lambda: db.list_by_user("user-1", 10)
+
+
+def bench_from_json(kind):
+    """ChatMessage.from_json for text and tool messages"""
+    data = message("ASSISTANT", ANSWER) if kind == "text" else tool_message()
+    return lambda: ChatMessage.from_json(data)
+
+
+def bench_markdown(size):
+    """the markdown template filter for answers of varying size"""
+    text = (ANSWER * (size // len(ANSWER) + 1))[:size]
+    return lambda: main.render_markdown(text)
+
+
+def bench_render_chat(turns):
+    """chat.html rendering including markdown for every answer"""
+    conversation = {
+        "conversationId": "s0",
+        "questions": [{"q": f"question {i}?", "a": ANSWER} for i in range(turns)],
+    }
+
+    def render():
+        with main.app.test_request_context():
+            render_template("chat.html", conversation=conversation, sources=[])
+    return render
+
+
+BENCHMARKS = [
+    ("translate", bench_translate, [10, 100, 1000]),
+    ("list_by_user", bench_list_by_user, [10, 100, 1000, 5000]),
+    ("from_json", bench_from_json, ["text", "tool"]),
+    ("markdown", bench_markdown, [100, 1000, 10000]),
+    ("render_chat", bench_render_chat, [10, 100, 1000]),
+]
+
+
+def measure(fn, repeat, min_time):
+    """returns per call timings in seconds, one per sample"""
+    fn()  # warm up
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    # scale up so that each sample takes at least min_time
+    per_call = timer.timeit(number) / number
+    number = max(number, int(min_time / per_call) if per_call > 0 else number)
+    return [t / number for t in timer.repeat(repeat=repeat, number=number)]
+
+
+def run(args):
+    results = {}
+    for name, factory, params in BENCHMARKS:
+        if args.filter not in name:
+            continue
+        for param in params[:1] if args.quick else params:
+            key = f"{name}[{param}]"
+            samples = measure(factory(param), args.repeat, args.min_time)
+            results[key] = {
+                "min": min(samples),
+                "median": statistics.median(samples),
+                "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+            }
+            r = results[key]
+            print(f"{key:<24} min {r['min'] * 1000:>10.3f} ms   "
+                  f"median {r['median'] * 1000:>10.3f} ms   "
+                  f"stdev {r['stdev'] * 1000:>8.3f} ms", flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """prints changes vs a baseline and returns the number of regressions"""
+    regressions = 0
+    print()
+    for key, r in results.items():
+        if key not in baseline:
+            continue
+        # min is the least noisy estimate of the true cost
+        change = r["min"] / baseline[key]["min"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{key:<24} {change * 100:>+8.1f}%{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    results = run(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold) > 0:
+            sys.exit(1)
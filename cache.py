@@ -0,0 +1,350 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from opentelemetry import metrics
+
+meter = metrics.get_meter(__name__)
+operations = meter.create_counter(
+    "app.cache.operations",
+    description="cache hits, misses, evictions and backend errors",
+)
+
+
+class Cache():
+    """
+    Base class for cache backends. Backends implement load, store, remove,
+    counter and increment. Values must be json serializable, since shared
+    backends store them as json (never pickle, which would let anyone able
+    to write to the store execute code in the app). Entries are grouped
+    into namespaces that can be invalidated as a whole by bumping the
+    namespace's version, which makes the old entries unreachable until
+    they expire.
+    """
+
+    name = "cache"
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        # version counters expire too, but only once every entry stored
+        # under them has (a counter that expires resets to 0)
+        self.counter_ttl = 2 * ttl if ttl else None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def load(self, key):
+        """returns (True, value) if key is cached, otherwise (False, None)"""
+        raise NotImplementedError
+
+    def store(self, key, value, ttl):
+        raise NotImplementedError
+
+    def remove(self, key):
+        raise NotImplementedError
+
+    def counter(self, key):
+        """returns the value of an integer counter (0 if it doesn't exist)"""
+        raise NotImplementedError
+
+    def increment(self, key):
+        """atomically increments an integer counter and returns it"""
+        raise NotImplementedError
+
+    def count(self, outcome, n=1):
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + n)
+        operations.add(n, {"backend": self.name, "outcome": outcome})
+
+    def version(self, namespace):
+        return self.counter(f"version:{namespace}")
+
+    def failed(self, operation, error):
+        """backend errors are logged and counted but never fail a request"""
+        logging.warning(f"{self.name} cache {operation} failed: {error}")
+        self.count("errors")
+
+    def invalidate(self, namespace):
+        """invalidates every entry in a namespace"""
+        try:
+            self.increment(f"version:{namespace}")
+        except Exception as e:
+            self.failed("invalidate", e)
+
+    def get_or_load(self, namespace, key, loader, *args, flight=None, **kwargs):
+        """
+        returns a cached value, calling loader to populate it on a miss.
+        concurrent misses can share a single load via a singleflight group.
+        """
+        # read the version before loading so that an invalidation
+        # during the load isn't overwritten with stale data
+        try:
+            version = self.version(namespace)
+            full_key = f"{namespace}:v{version}:{key}"
+            found, value = self.load(full_key)
+        except Exception as e:
+            self.failed("load", e)
+            version, full_key, found = None, None, False
+        else:
+            self.count("hits" if found else "misses")
+        if found:
+            return value
+        if flight is not None:
+            # the version is part of the flight key so that a load started
+            # after an invalidation never joins one that started before it
+            value = flight.do((namespace, version, key),
+                              loader, *args, **kwargs)
+        else:
+            value = loader(*args, **kwargs)
+        if full_key is not None:
+            try:
+                self.store(full_key, value, self.ttl)
+            except Exception as e:
+                self.failed("store", e)
+        return value
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
+
+
+class NoCache(Cache):
+    """disables caching"""
+
+    name = "none"
+
+    def load(self, key):
+        return False, None
+
+    def store(self, key, value, ttl):
+        pass
+
+    def remove(self, key):
+        pass
+
+    def counter(self, key):
+        return 0
+
+    def increment(self, key):
+        return 0
+
+
+class MemoryCache(Cache):
+    """in-process LRU cache"""
+
+    name = "memory"
+
+    def __init__(self, ttl, max_entries):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        # counters are kept in their own lru, bounded by max_entries.
+        # versions are drawn from a single increasing sequence, and a
+        # namespace whose counter was evicted reads the highest evicted
+        # version (the floor), which is at least its last version, so its
+        # older (stale) entries never become reachable again
+        self.counters = OrderedDict()
+        self.sequence = 0
+        self.floor = 0
+        self.entries_lock = threading.Lock()
+
+    def load(self, key):
+        with self.entries_lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self.entries[key]
+                expired = True
+            else:
+                self.entries.move_to_end(key)
+                expired = False
+        if expired:
+            self.count("evictions")
+            return False, None
+        return True, value
+
+    def store(self, key, value, ttl):
+        expires = time.monotonic() + ttl if ttl else None
+        evicted = 0
+        with self.entries_lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self.count("evictions", evicted)
+
+    def remove(self, key):
+        with self.entries_lock:
+            self.entries.pop(key, None)
+
+    def counter(self, key):
+        with self.entries_lock:
+            value = self.counters.get(key)
+            if value is None:
+                return self.floor
+            self.counters.move_to_end(key)
+            return value
+
+    def increment(self, key):
+        with self.entries_lock:
+            self.sequence += 1
+            self.counters[key] = self.sequence
+            self.counters.move_to_end(key)
+            while len(self.counters) > self.max_entries:
+                _, value = self.counters.popitem(last=False)
+                self.floor = max(self.floor, value)
+            return self.sequence
+
+
+class DiskCache(Cache):
+    """
+    sqlite backed cache shared by all worker processes on a host
+    """
+
+    name = "disk"
+
+    def __init__(self, ttl, max_entries, path):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self.path = path
+        self.local = threading.local()
+        db = self.connection()
+        db.execute("""CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY, value BLOB, expires REAL)""")
+        db.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache(expires)")
+        # counters live in their own table so that they neither count
+        # towards max_entries nor get evicted
+        db.execute("""CREATE TABLE IF NOT EXISTS counters (
+            key TEXT PRIMARY KEY, value INTEGER, expires REAL)""")
+        db.execute("CREATE INDEX IF NOT EXISTS counters_expires ON counters(expires)")
+        db.commit()
+        logging.info(f"using disk cache at {path}")
+
+    def connection(self):
+        """one connection per thread"""
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10,
+                                 isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    def load(self, key):
+        row = self.connection().execute(
+            "SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False, None
+        value, expires = row
+        if expires is not None and expires < time.time():
+            self.remove(key)
+            self.count("evictions")
+            return False, None
+        return True, json.loads(value)
+
+    def store(self, key, value, ttl):
+        expires = time.time() + ttl if ttl else None
+        db = self.connection()
+        db.execute("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                   (key, json.dumps(value), expires))
+
+        # evict expired entries, then the ones closest to expiring
+        evicted = db.execute("DELETE FROM cache WHERE expires < ?",
+                             (time.time(),)).rowcount
+        evicted += db.execute("""DELETE FROM cache WHERE key IN (
+            SELECT key FROM cache
+            ORDER BY expires LIMIT max(0, (SELECT count(*) FROM cache) - ?))""",
+                              (self.max_entries,)).rowcount
+        if evicted > 0:
+            self.count("evictions", evicted)
+
+        db.execute("DELETE FROM counters WHERE expires < ?", (time.time(),))
+
+    def remove(self, key):
+        self.connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def counter(self, key):
+        row = self.connection().execute(
+            """SELECT value FROM counters
+            WHERE key = ? AND (expires IS NULL OR expires >= ?)""",
+            (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def increment(self, key):
+        now = time.time()
+        expires = now + self.counter_ttl if self.counter_ttl else None
+        return self.connection().execute(
+            """INSERT INTO counters (key, value, expires) VALUES (?, 1, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                value = CASE WHEN expires < ? THEN 1 ELSE value + 1 END,
+                expires = excluded.expires
+            RETURNING value""", (key, expires, now)).fetchone()[0]
+
+
+class RedisCache(Cache):
+    """
+    redis (or valkey/elasticache) backed cache shared by all workers and tasks.
+    redis evicts entries itself, so evictions are not counted here.
+    """
+
+    name = "redis"
+
+    def __init__(self, ttl, url):
+        super().__init__(ttl)
+        import redis
+        # fail fast so that an unreachable store degrades to cache misses
+        self.client = redis.Redis.from_url(
+            url, socket_connect_timeout=0.5, socket_timeout=0.5)
+        logging.info(f"using redis cache at {url}")
+
+    def load(self, key):
+        value = self.client.get(key)
+        if value is None:
+            return False, None
+        return True, json.loads(value)
+
+    def store(self, key, value, ttl):
+        self.client.set(key, json.dumps(value),
+                        px=int(ttl * 1000) if ttl else None)
+
+    def remove(self, key):
+        self.client.delete(key)
+
+    def counter(self, key):
+        value = self.client.get(key)
+        return int(value) if value is not None else 0
+
+    def increment(self, key):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.incr(key)
+        if self.counter_ttl:
+            pipe.pexpire(key, int(self.counter_ttl * 1000))
+        return pipe.execute()[0]
+
+
+def create(config):
+    """creates the cache backend selected by configuration"""
+    backend = config.CACHE_BACKEND
+    if backend == "memory":
+        return MemoryCache(config.CACHE_TTL, config.CACHE_MAX_ENTRIES)
+    if backend == "disk":
+        return DiskCache(config.CACHE_TTL, config.CACHE_MAX_ENTRIES, config.CACHE_PATH)
+    if backend == "redis":
+        return RedisCache(config.CACHE_TTL, config.CACHE_URL)
+    if backend == "none":
+        return NoCache(config.CACHE_TTL)
+    raise Exception(f"unknown CACHE_BACKEND: {backend}")
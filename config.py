@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 
 class Config:
@@ -16,3 +17,48 @@ class Config:
     MEMORY_ID = os.environ.get("MEMORY_ID", "")
     if MEMORY_ID == "":
         raise Exception("MEMORY_ID is required")
+
+    # OpenTelemetry
+    # the standard OTEL_SDK_DISABLED variable turns off trace and metric export
+    OTEL_SDK_DISABLED = os.environ.get(
+        "OTEL_SDK_DISABLED", "false").lower() == "true"
+
+    # Logging
+    # payloads larger than LOG_MAX_PAYLOAD characters are truncated and
+    # only LOG_LARGE_SAMPLE_RATE (0.0 - 1.0) of those below WARNING are emitted
+    LOG_MAX_PAYLOAD = int(os.environ.get("LOG_MAX_PAYLOAD", "4096"))
+    LOG_LARGE_SAMPLE_RATE = float(
+        os.environ.get("LOG_LARGE_SAMPLE_RATE", "0.1"))
+
+    # HTTP
+    # responses smaller than this many bytes are sent uncompressed
+    COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+
+    # Profiling
+    # requests to /debug/profile must send this token in an X-Debug-Token
+    # header. profiling is disabled when it is not set.
+    PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+    # seconds between samples of the always-on profiler (0 disables it)
+    PROFILE_CONTINUOUS_INTERVAL = float(
+        os.environ.get("PROFILE_CONTINUOUS_INTERVAL", "0"))
+
+    # Idempotency
+    # duplicate asks with the same Idempotency-Key within this many seconds
+    # get the original answer back
+    IDEMPOTENCY_WINDOW = float(os.environ.get("IDEMPOTENCY_WINDOW", "60"))
+    # asks without a key are matched on user, conversation and question, so
+    # this window only needs to cover double submits and client retries
+    IDEMPOTENCY_DERIVED_WINDOW = float(
+        os.environ.get("IDEMPOTENCY_DERIVED_WINDOW", "5"))
+
+    # Caching
+    # memory (per process lru), disk (sqlite file shared by the workers on
+    # a host), redis (shared by all workers and tasks) or none
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+    # seconds before cached conversations, history and fragments expire
+    CACHE_TTL = float(os.environ.get("CACHE_TTL", "60"))
+    # maximum entries held by the memory and disk backends
+    CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "1000"))
+    CACHE_PATH = os.environ.get(
+        "CACHE_PATH", os.path.join(tempfile.gettempdir(), "cache.db"))
+    CACHE_URL = os.environ.get("CACHE_URL", "redis://localhost:6379/0")
@@ -2,71 +2,136 @@ import os
 import log
 import logging
 import boto3
+import timing
 from bedrock_agentcore.memory import MemoryClient
 from config import Config
 from chat_message import ChatMessage
+from singleflight import Group
+from cache import NoCache
 
 memory_client = MemoryClient(region_name=Config.AWS_REGION)
 memory_id = Config.MEMORY_ID
 memory_data_client = boto3.client("bedrock-agentcore")
 
 
+def events_version(events):
+    """
+    derives a version string for a list of memory events from the latest
+    event's id and timestamp (and the number of events)
+    """
+    if not events:
+        return "0"
+    latest = max(events, key=lambda e: str(e.get("eventTimestamp", "")))
+    return f"{len(events)}-{latest.get('eventId', '')}-{latest.get('eventTimestamp', '')}"
+
+
+def translate(events):
+    """
+    translates a list of memory events (most recent first) into a list
+    of question/answer pairs
+    """
+
+    # iterate the list of events backwards
+    questions = []
+    current_question = None
+    current_answer = None
+
+    # Process events in reverse chronological order (oldest first)
+    for event in reversed(events):
+        if 'payload' in event and event['payload']:
+            for payload_item in event['payload']:
+                if 'conversational' in payload_item:
+                    conv = payload_item['conversational']
+                    role = conv.get('role')
+                    content = conv.get('content', {}).get('text', '')
+
+                    # content is json encoded in memory
+                    msg = ChatMessage.from_json(content)
+
+                    # Skip tool related messages as they're intermediate
+                    if msg.is_tool_message():
+                        continue
+
+                    content_text = msg.get_text_content()
+
+                    if role == 'USER':
+                        # If we have a complete Q&A pair, save it
+                        if current_question and current_answer:
+                            questions.append({
+                                "q": current_question,
+                                "a": current_answer
+                            })
+
+                        # Start new question
+                        current_question = content_text
+                        current_answer = None
+
+                    elif role == 'ASSISTANT':
+                        # Set the answer for current question
+                        current_answer = content_text
+
+    # Add the last Q&A pair if it exists
+    if current_question and current_answer:
+        questions.append({
+            "q": current_question,
+            "a": current_answer
+        })
+
+    return questions
+
+
 class Database():
     """Memory database abstraction"""
 
+    def __init__(self, cache=None):
+        # concurrent identical reads share a single remote fetch
+        self.flight = Group("database")
+        self.cache = cache if cache is not None else NoCache(0)
+
+    @property
+    def coalesced(self):
+        """number of reads that were served by another in-flight read"""
+        return self.flight.coalesced
+
     def get(self, conversation_id, user_id):
         """fetch a conversation by id and user"""
+        return self.cache.get_or_load(
+            f"conversation:{user_id}:{conversation_id}", "get",
+            self._get, conversation_id, user_id, flight=self.flight)
+
+    def list_by_user(self, user_id, top):
+        """fetch a list of conversations by user, sorted by latest activity"""
+        # a failed fetch shows an empty history but isn't cached, so the
+        # next request tries again
+        try:
+            return self.cache.get_or_load(
+                f"history:{user_id}", top,
+                self._list_by_user, user_id, top, flight=self.flight)
+        except Exception:
+            logging.exception(f"error fetching history for user {user_id}")
+            return []
 
-        events = memory_client.list_events(memory_id, user_id, conversation_id)
+    def invalidate(self, conversation_id, user_id):
+        """
+        called after a conversation is written to so that subsequent reads
+        don't return cached data or join a fetch that started before the write
+        """
+        namespaces = (f"conversation:{user_id}:{conversation_id}",
+                      f"history:{user_id}")
+        # flights are keyed by (namespace, version, key)
+        self.flight.forget_matching(lambda key: key[0] in namespaces)
+        for namespace in namespaces:
+            self.cache.invalidate(namespace)
+
+    def _get(self, conversation_id, user_id):
+        with timing.stage("memory_fetch"):
+            events = memory_client.list_events(
+                memory_id, user_id, conversation_id)
         logging.info(f"found {len(events)} events")
         log.info(events)
 
-        # translate list of events into a conversation with question/answer groupings
-        # iterate the list of events backwards
-        questions = []
-        current_question = None
-        current_answer = None
-
-        # Process events in reverse chronological order (oldest first)
-        for event in reversed(events):
-            if 'payload' in event and event['payload']:
-                for payload_item in event['payload']:
-                    if 'conversational' in payload_item:
-                        conv = payload_item['conversational']
-                        role = conv.get('role')
-                        content = conv.get('content', {}).get('text', '')
-
-                        # content is json encoded in memory
-                        msg = ChatMessage.from_json(content)
-
-                        # Skip tool related messages as they're intermediate
-                        if msg.is_tool_message():
-                            continue
-
-                        content_text = msg.get_text_content()
-
-                        if role == 'USER':
-                            # If we have a complete Q&A pair, save it
-                            if current_question and current_answer:
-                                questions.append({
-                                    "q": current_question,
-                                    "a": current_answer
-                                })
-
-                            # Start new question
-                            current_question = content_text
-                            current_answer = None
-
-                        elif role == 'ASSISTANT':
-                            # Set the answer for current question
-                            current_answer = content_text
-
-        # Add the last Q&A pair if it exists
-        if current_question and current_answer:
-            questions.append({
-                "q": current_question,
-                "a": current_answer
-            })
+        with timing.stage("translate"):
+            questions = translate(events)
 
         # For now, return empty sources array - this could be enhanced
         # to extract source information from tool calls or other metadata
@@ -74,22 +139,19 @@ class Database():
             "conversationId": conversation_id,
             "user_id": user_id,
             "questions": questions,
-            "sources": []
+            "sources": [],
+            "version": events_version(events),
         }
         log.info("translated data...")
         log.info(result)
         return result
 
-    def list_by_user(self, user_id, top):
-        """fetch a list of conversations by user, sorted by latest activity"""
-
-        try:
+    def _list_by_user(self, user_id, top):
+        with timing.stage("history_fetch", span=False):
             response = memory_data_client.list_sessions(
                 memoryId=memory_id,
                 actorId=user_id,
             )
-        except:
-            return []
 
         sessions_with_events = []
         logging.info(
@@ -99,13 +161,14 @@ class Database():
             session_id = session['sessionId']
             logging.info(f"Processing session: {session_id}")
 
-            events_response = memory_data_client.list_events(
-                memoryId=memory_id,
-                actorId=user_id,
-                sessionId=session_id,
-                includePayloads=True,
-                maxResults=100,
-            )
+            with timing.stage("history_fetch", span=False):
+                events_response = memory_data_client.list_events(
+                    memoryId=memory_id,
+                    actorId=user_id,
+                    sessionId=session_id,
+                    includePayloads=True,
+                    maxResults=100,
+                )
             events = events_response.get('events', [])
             logging.info(f"Session {session_id} has {len(events)} events")
 
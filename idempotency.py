@@ -0,0 +1,59 @@
+import time
+import hashlib
+import threading
+from singleflight import Group
+
+
+def derive_key(*parts):
+    """derives an idempotency key from the parts of a request"""
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+class Store():
+    """
+    Runs a function at most once per idempotency key within a time window.
+    Duplicate calls made while the first is in flight wait for and share its
+    result, and duplicates made after it completes (within the window) get
+    the stored result back without calling the function again.
+    The window can be overridden per call.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.flight = Group("asks")
+        self.lock = threading.Lock()
+        self.results = {}
+        self.replayed = 0
+
+    def do(self, key, fn, *args, window=None, **kwargs):
+        found, result = self.lookup(key)
+        if found:
+            return result
+        if window is None:
+            window = self.window
+        return self.flight.do(key, self.run, key, window, fn, *args, **kwargs)
+
+    def lookup(self, key):
+        """returns (True, result) if a completed call is stored for key"""
+        with self.lock:
+            entry = self.results.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return False, None
+            self.replayed += 1
+            return True, entry[1]
+
+    def run(self, key, window, fn, *args, **kwargs):
+        # the call may have completed between lookup and joining the flight
+        found, result = self.lookup(key)
+        if found:
+            return result
+
+        result = fn(*args, **kwargs)
+
+        now = time.monotonic()
+        with self.lock:
+            # drop expired results so the store stays bounded by the window
+            for k in [k for k, (expires, _) in self.results.items() if expires < now]:
+                del self.results[k]
+            self.results[key] = (now + window, result)
+        return result
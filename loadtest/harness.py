@@ -0,0 +1,148 @@
+"""
+Load harness for the web app. Drives /ask, /conversations and
+/conversation/<id> at a configurable concurrency and reports latency
+percentiles and throughput per endpoint.
+"""
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import http.client
+import statistics
+import urllib.error
+import urllib.parse
+import urllib.request
+
+parser = argparse.ArgumentParser(description="Load test the web app")
+parser.add_argument("--url", default="http://localhost:8080")
+parser.add_argument("--user-id", default="user-1")
+parser.add_argument("--concurrency", type=int, default=4)
+parser.add_argument("--duration", type=float, default=30,
+                    help="seconds to run the test for")
+parser.add_argument("--ask-weight", type=int, default=1)
+parser.add_argument("--conversations-weight", type=int, default=5)
+parser.add_argument("--conversation-weight", type=int, default=10)
+parser.add_argument("--revalidate", action="store_true",
+                    help="send If-None-Match with previously seen etags")
+parser.add_argument("--timeout", type=float, default=60,
+                    help="seconds before a request is recorded as failed")
+
+
+class Results():
+    """thread safe latency and error collection per endpoint"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.not_modified = {}
+
+    def record(self, name, seconds, status):
+        with self.lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            if status == 304:
+                self.not_modified[name] = self.not_modified.get(name, 0) + 1
+            elif status >= 400:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, elapsed):
+        print(f"{'endpoint':<20} {'count':>7} {'rps':>8} {'p50 ms':>9} "
+              f"{'p95 ms':>9} {'p99 ms':>9} {'304s':>6} {'errors':>7}")
+        total = 0
+        for name, latencies in sorted(self.latencies.items()):
+            total += len(latencies)
+            p50, p95, p99 = percentiles(latencies)
+            print(f"{name:<20} {len(latencies):>7} {len(latencies) / elapsed:>8.1f} "
+                  f"{p50:>9.1f} {p95:>9.1f} {p99:>9.1f} "
+                  f"{self.not_modified.get(name, 0):>6} {self.errors.get(name, 0):>7}")
+        print(f"total: {total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+
+
+def percentiles(latencies):
+    """returns p50, p95 and p99 in milliseconds"""
+    if len(latencies) == 1:
+        return (latencies[0] * 1000,) * 3
+    q = statistics.quantiles(latencies, n=100, method="inclusive")
+    return q[49] * 1000, q[94] * 1000, q[98] * 1000
+
+
+class Client():
+    """a single simulated user"""
+
+    def __init__(self, args, results, conversation_ids):
+        self.args = args
+        self.results = results
+        self.conversation_ids = conversation_ids
+        self.etags = {}
+
+    def request(self, name, path, data=None):
+        headers = {"Accept-Encoding": "gzip"}
+        if self.args.revalidate and path in self.etags:
+            headers["If-None-Match"] = self.etags[path]
+        if data is not None:
+            data = urllib.parse.urlencode(data).encode()
+        req = urllib.request.Request(self.args.url + path, data=data,
+                                     headers=headers)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=self.args.timeout) as resp:
+                resp.read()
+                status = resp.status
+                if resp.headers.get("ETag"):
+                    self.etags[path] = resp.headers["ETag"]
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except (OSError, http.client.HTTPException):
+            # connection refused/reset, timeouts and malformed responses
+            status = 599
+        self.results.record(name, time.perf_counter() - start, status)
+
+    def run(self, deadline):
+        weights = [self.args.ask_weight,
+                   self.args.conversations_weight,
+                   self.args.conversation_weight]
+        while time.monotonic() < deadline:
+            choice = random.choices(range(3), weights=weights)[0]
+            if choice == 0:
+                conversation_id = random.choice(self.conversation_ids + [""])
+                self.request("/ask", "/ask", {
+                    "conversation_id": conversation_id,
+                    # unique so that asks aren't de-duplicated
+                    "question": f"How does the load harness work? ({uuid.uuid4()})",
+                })
+            elif choice == 1:
+                self.request("/conversations", "/conversations")
+            elif self.conversation_ids:
+                conversation_id = random.choice(self.conversation_ids)
+                self.request("/conversation/<id>",
+                             f"/conversation/{conversation_id}")
+
+
+def main():
+    args = parser.parse_args()
+
+    # discover existing conversations to read
+    url = f"{args.url}/api/conversations/users/{args.user_id}"
+    with urllib.request.urlopen(url, timeout=args.timeout) as resp:
+        conversation_ids = [c["conversationId"] for c in json.load(resp)]
+    print(f"found {len(conversation_ids)} conversations for {args.user_id}")
+    print(f"running {args.concurrency} clients for {args.duration}s "
+          f"against {args.url}")
+
+    results = Results()
+    deadline = time.monotonic() + args.duration
+    threads = [threading.Thread(target=Client(args, results, conversation_ids).run,
+                                args=(deadline,))
+               for _ in range(args.concurrency)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results.report(time.monotonic() - start)
+
+
+if __name__ == "__main__":
+    main()
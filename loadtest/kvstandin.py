@@ -0,0 +1,101 @@
+"""
+Local stand-in for a redis compatible key value store, implementing the
+subset of commands used by the redis cache backend (GET, SET with PX/EX,
+DEL, INCR/INCRBY, EXPIRE/PEXPIRE and PING).
+
+Point the web app at it by setting
+CACHE_BACKEND=redis CACHE_URL=redis://localhost:6380/0
+"""
+import time
+import argparse
+import threading
+import socketserver
+
+parser = argparse.ArgumentParser(
+    description="Local stand-in for a redis compatible key value store")
+parser.add_argument("--port", type=int, default=6380)
+
+# key -> (value, expires)
+store = {}
+lock = threading.Lock()
+
+
+def get(key):
+    entry = store.get(key)
+    if entry is None:
+        return None
+    value, expires = entry
+    if expires is not None and expires < time.monotonic():
+        del store[key]
+        return None
+    return value
+
+
+def execute(args):
+    """executes a command and returns a resp encoded reply"""
+    command = args[0].upper()
+    with lock:
+        if command == b"PING":
+            return b"+PONG\r\n"
+        if command == b"GET":
+            value = get(args[1])
+            if value is None:
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        if command == b"SET":
+            expires = None
+            options = [a.upper() for a in args[3:]]
+            if b"PX" in options:
+                expires = time.monotonic() + int(args[3 + options.index(b"PX") + 1]) / 1000
+            elif b"EX" in options:
+                expires = time.monotonic() + int(args[3 + options.index(b"EX") + 1])
+            store[args[1]] = (args[2], expires)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            deleted = sum(1 for key in args[1:] if store.pop(key, None) is not None)
+            return b":%d\r\n" % deleted
+        if command in (b"INCR", b"INCRBY"):
+            amount = int(args[2]) if command == b"INCRBY" else 1
+            value = get(args[1])
+            expires = store[args[1]][1] if value is not None else None
+            value = int(value or 0) + amount
+            store[args[1]] = (str(value).encode(), expires)
+            return b":%d\r\n" % value
+        if command in (b"EXPIRE", b"PEXPIRE"):
+            value = get(args[1])
+            if value is None:
+                return b":0\r\n"
+            scale = 1000 if command == b"PEXPIRE" else 1
+            store[args[1]] = (value, time.monotonic() + int(args[2]) / scale)
+            return b":1\r\n"
+    return b"-ERR unknown command '%s'\r\n" % command
+
+
+class Handler(socketserver.StreamRequestHandler):
+    """reads resp arrays of bulk strings and writes replies"""
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if not line.startswith(b"*"):
+                self.wfile.write(b"-ERR protocol error\r\n")
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            self.wfile.write(execute(args))
+
+
+class Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    print(f"key value stand-in listening on localhost:{args.port}")
+    with Server(("0.0.0.0", args.port), Handler) as server:
+        server.serve_forever()
@@ -0,0 +1,189 @@
+"""
+Local stand-in for the Bedrock AgentCore runtime and memory data plane APIs
+used by the web app (InvokeAgentRuntime, ListEvents and ListSessions).
+
+Point the web app at it by setting
+AWS_ENDPOINT_URL_BEDROCK_AGENTCORE=http://localhost:9000
+"""
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone, timedelta
+from flask import Flask, request, Response
+
+parser = argparse.ArgumentParser(
+    description="Local stand-in for AgentCore runtime and memory")
+parser.add_argument("--port", type=int, default=9000)
+parser.add_argument("--invoke-latency", type=float, default=2.0,
+                    help="seconds taken by InvokeAgentRuntime")
+parser.add_argument("--memory-latency", type=float, default=0.05,
+                    help="seconds taken by ListEvents and ListSessions")
+parser.add_argument("--jitter", type=float, default=0.1,
+                    help="random +/- fraction applied to latencies")
+parser.add_argument("--answer-size", type=int, default=2000,
+                    help="approximate number of characters in each answer")
+parser.add_argument("--sessions", type=int, default=20,
+                    help="number of sessions seeded for each user")
+parser.add_argument("--events-per-session", type=int, default=10,
+                    help="number of events seeded in each session")
+
+app = Flask(__name__)
+args = None
+
+# actor id -> session id -> list of events (oldest first)
+store = {}
+lock = threading.Lock()
+
+logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+
+def sleep(seconds):
+    """simulates service latency"""
+    if seconds > 0:
+        time.sleep(seconds * random.uniform(1 - args.jitter, 1 + args.jitter))
+
+
+def answer(prompt):
+    """generates a markdown answer of roughly the configured size"""
+    paragraph = ("This is a **generated** answer from the local stand-in. "
+                 "It contains `code`, *emphasis* and a [link](https://example.com). ")
+    body = f"You asked: {prompt}\n\n"
+    while len(body) < args.answer_size:
+        body += paragraph
+        if len(body) % 5 == 0:
+            body += "\n\n- a list item\n- another list item\n\n"
+    return body[:args.answer_size]
+
+
+def event(actor_id, session_id, role, text, timestamp):
+    """creates a conversational memory event in the same shape as strands"""
+    message = {
+        "message": {
+            "role": role.lower(),
+            "content": [{"text": text}],
+        },
+    }
+    return {
+        "memoryId": "local",
+        "actorId": actor_id,
+        "sessionId": session_id,
+        "eventId": str(uuid.uuid4()),
+        "eventTimestamp": timestamp.timestamp(),
+        "payload": [{
+            "conversational": {
+                "role": role,
+                "content": {"text": json.dumps(message)},
+            }
+        }],
+    }
+
+
+def sessions_for(actor_id):
+    """returns the sessions for an actor, seeding them on first access"""
+    with lock:
+        if actor_id not in store:
+            now = datetime.now(timezone.utc)
+            sessions = {}
+            for s in range(args.sessions):
+                session_id = str(uuid.uuid4())
+                start = now - timedelta(hours=s + 1)
+                events = []
+                for e in range(args.events_per_session):
+                    ts = start + timedelta(seconds=e)
+                    if e % 2 == 0:
+                        events.append(event(actor_id, session_id, "USER",
+                                            f"question {e // 2} in session {s}", ts))
+                    else:
+                        events.append(event(actor_id, session_id, "ASSISTANT",
+                                            answer(f"question {e // 2}"), ts))
+                sessions[session_id] = events
+            store[actor_id] = sessions
+        return store[actor_id]
+
+
+def page(items, body, default_max):
+    """paginates a list using an offset as the next token"""
+    start = int(body.get("nextToken") or 0)
+    end = start + int(body.get("maxResults") or default_max)
+    next_token = str(end) if end < len(items) else None
+    return items[start:end], next_token
+
+
+def json_response(data, status=200):
+    return Response(json.dumps(data), status=status,
+                    content_type="application/json")
+
+
+@app.route("/runtimes/<path:arn>/invocations", methods=["POST"])
+def invoke_agent_runtime(arn):
+    """InvokeAgentRuntime: answers the prompt and records the turn in memory"""
+    req = json.loads(request.get_data())
+    prompt = req["input"]["prompt"]
+    user_id = req["input"]["user_id"]
+    session_id = request.headers.get(
+        "X-Amzn-Bedrock-AgentCore-Runtime-Session-Id", str(uuid.uuid4()))
+
+    sleep(args.invoke_latency)
+    text = answer(prompt)
+
+    sessions = sessions_for(user_id)
+    now = datetime.now(timezone.utc)
+    with lock:
+        events = sessions.setdefault(session_id, [])
+        events.append(event(user_id, session_id, "USER", prompt, now))
+        events.append(event(user_id, session_id, "ASSISTANT", text,
+                            now + timedelta(milliseconds=1)))
+
+    resp = json_response({
+        "message": {"role": "assistant", "content": [{"text": text}]}
+    })
+    resp.headers["X-Amzn-Bedrock-AgentCore-Runtime-Session-Id"] = session_id
+    return resp
+
+
+@app.route("/memories/<memory_id>/actor/<actor_id>/sessions", methods=["POST"])
+def list_sessions(memory_id, actor_id):
+    """ListSessions: returns session summaries, most recently created first"""
+    body = request.get_json(silent=True) or {}
+    sleep(args.memory_latency)
+    sessions = sessions_for(actor_id)
+    with lock:
+        summaries = [{
+            "sessionId": session_id,
+            "actorId": actor_id,
+            "createdAt": events[0]["eventTimestamp"] if events else time.time(),
+        } for session_id, events in sessions.items()]
+    summaries.sort(key=lambda s: s["createdAt"], reverse=True)
+    items, next_token = page(summaries, body, 20)
+    result = {"sessionSummaries": items}
+    if next_token:
+        result["nextToken"] = next_token
+    return json_response(result)
+
+
+@app.route("/memories/<memory_id>/actor/<actor_id>/sessions/<session_id>", methods=["POST"])
+def list_events(memory_id, actor_id, session_id):
+    """ListEvents: returns a session's events, most recent first"""
+    body = request.get_json(silent=True) or {}
+    sleep(args.memory_latency)
+    sessions = sessions_for(actor_id)
+    with lock:
+        events = list(reversed(sessions.get(session_id, [])))
+    if not body.get("includePayloads", True):
+        events = [{k: v for k, v in e.items() if k != "payload"} | {"payload": []}
+                  for e in events]
+    items, next_token = page(events, body, 100)
+    result = {"events": items}
+    if next_token:
+        result["nextToken"] = next_token
+    return json_response(result)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    print(f"agentcore stand-in listening on http://localhost:{args.port}")
+    app.run(host="0.0.0.0", port=args.port, threaded=True)
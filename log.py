@@ -1,31 +1,180 @@
 import logging
+import logging.handlers
 import json
+import itertools
+import queue
+import random
+import atexit
+from config import Config
 
-# logging.basicConfig(format="%(message)s", level=logging.DEBUG)
-logging.basicConfig(format="%(message)s", level=logging.INFO)
+# log records are handed off to a queue on the request thread and
+# formatted/written by a background listener thread. objects passed to
+# debug/info/llm are only serialized if the record is actually emitted.
+log_queue = queue.SimpleQueue()
+
+
+def estimate_size(obj, limit):
+    """
+    roughly estimates the json size of obj without serializing it,
+    walking at most until the estimate passes limit
+    """
+    size = 0
+    stack = [iter((obj,))]
+    while stack and size <= limit:
+        item = next(stack[-1], stack)
+        if item is stack:
+            stack.pop()
+        elif isinstance(item, str):
+            size += len(item) + 3
+        elif isinstance(item, dict):
+            size += 2
+            stack.append(itertools.chain.from_iterable(item.items()))
+        elif isinstance(item, (list, tuple)):
+            size += 2
+            stack.append(iter(item))
+        else:
+            size += 8
+    return size
+
+
+def truncate(obj, limit):
+    """
+    returns a copy of obj cut down to roughly limit characters of json,
+    so that large payloads are never serialized in full
+    """
+    budget = [limit]
+
+    def walk(item):
+        if isinstance(item, str):
+            budget[0] -= len(item) + 3
+            if budget[0] < 0:
+                return f"{item[:max(len(item) + budget[0], 0)]}...[truncated]"
+            return item
+        if isinstance(item, dict):
+            out = {}
+            for k, v in item.items():
+                if budget[0] <= 0:
+                    out["..."] = f"{len(item) - len(out)} more keys"
+                    break
+                budget[0] -= len(str(k)) + 3
+                out[k] = walk(v)
+            return out
+        if isinstance(item, (list, tuple)):
+            out = []
+            for v in item:
+                if budget[0] <= 0:
+                    out.append(f"...{len(item) - len(out)} more items")
+                    break
+                out.append(walk(v))
+            return out
+        budget[0] -= 8
+        return item
+
+    return walk(obj)
+
+
+class LazyJson():
+    """
+    defers json serialization of an object until the record is formatted,
+    and then serializes at most about LOG_MAX_PAYLOAD characters of it
+    """
+
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def size(self):
+        """cheap estimate of the serialized size, used for sampling"""
+        return estimate_size(self.obj, Config.LOG_MAX_PAYLOAD)
+
+    def __str__(self):
+        view = truncate(self.obj, Config.LOG_MAX_PAYLOAD)
+        return json.dumps(view, separators=(",", ":"), default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """enqueue records as-is, leaving message formatting to the listener"""
+
+    def prepare(self, record):
+        return record
+
+
+class PayloadFilter(logging.Filter):
+    """
+    samples records with large payloads, then renders the message once.
+    the sampling decision uses a size estimate so that dropped records are
+    never serialized. warnings and errors are never sampled out (only
+    truncated).
+    """
+
+    def filter(self, record):
+        if (record.levelno < logging.WARNING
+                and payload_size(record) > Config.LOG_MAX_PAYLOAD
+                and random.random() >= Config.LOG_LARGE_SAMPLE_RATE):
+            return False
+        record.msg = record.getMessage()
+        record.args = None
+        return True
+
+
+def payload_size(record):
+    """estimated size of a record's message without rendering it"""
+    args = record.args
+    if not isinstance(args, tuple):
+        args = (args,) if args else ()
+    size = len(str(record.msg))
+    for arg in args:
+        size += arg.size() if isinstance(arg, LazyJson) else len(str(arg))
+    return size
+
+
+class TruncatingFormatter(logging.Formatter):
+    """truncates messages to the configured maximum payload size"""
+
+    def formatMessage(self, record):
+        message = super().formatMessage(record)
+        if len(message) > Config.LOG_MAX_PAYLOAD:
+            dropped = len(message) - Config.LOG_MAX_PAYLOAD
+            message = f"{message[:Config.LOG_MAX_PAYLOAD]}...[truncated {dropped} chars]"
+        return message
+
+
+stream_handler = logging.StreamHandler()
+stream_handler.setFormatter(TruncatingFormatter("%(message)s"))
+stream_handler.addFilter(PayloadFilter())
+
+listener = logging.handlers.QueueListener(
+    log_queue, stream_handler, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)
+
+# logging.basicConfig(handlers=[DeferredQueueHandler(log_queue)], level=logging.DEBUG)
+logging.basicConfig(handlers=[DeferredQueueHandler(log_queue)],
+                    level=logging.INFO)
 
 # disable http request logging
 # to avoid logging health checks
 log = logging.getLogger("werkzeug")
 log.setLevel(logging.ERROR)
 
+llm_log = logging.getLogger("llm")
+
 
 def debug(obj):
     """log object as json if in debug mode"""
-    if logging.getLogger().level <= logging.DEBUG:
-        logging.debug(json.dumps(obj, indent=2, default=str))
+    logging.debug("%s", LazyJson(obj))
 
 
 def info(obj):
     """log object as json if in info or debug mode"""
-    if logging.getLogger().level <= logging.INFO:
-        logging.info(json.dumps(obj, indent=2, default=str))
+    logging.info("%s", LazyJson(obj))
 
 
 def llm(input, output):
-    """log llm calls to stdout using specific format"""
+    """log llm calls using specific format"""
     payload = {
         "input": input,
         "output": output
     }
-    print(f"LLM: {json.dumps(payload, default=str)}")
+    llm_log.info("LLM: %s", LazyJson(payload))
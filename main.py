@@ -1,21 +1,33 @@
 import logging
 import log
+import os
 import sys
+import gzip
+import json
 import signal
+import hashlib
 from datetime import datetime, timezone
-from flask import Flask, request, render_template, abort
+from flask import Flask, request, render_template, abort, make_response
 from markupsafe import Markup
 import mistune
 import uuid
 import database
 import orchestrator
+import timing
+import profiler
+import idempotency
+import cache
+from config import Config
 
 # otel
 from opentelemetry.instrumentation.flask import FlaskInstrumentor
-from opentelemetry import trace
+from opentelemetry import trace, metrics
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import ConsoleSpanExporter, BatchSpanProcessor
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
 from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
 from opentelemetry.instrumentation.botocore import BotocoreInstrumentor
 
 
@@ -27,17 +39,23 @@ def signal_handler(signal, frame):
 signal.signal(signal.SIGTERM, signal_handler)
 app = Flask(__name__)
 
-# Setup OpenTelemetry
-tracer_provider = TracerProvider()
-tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
-trace.set_tracer_provider(tracer_provider)
-FlaskInstrumentor().instrument_app(app)
-BotocoreInstrumentor().instrument()
+# Setup OpenTelemetry (spans and metrics are no-ops when disabled)
+if not Config.OTEL_SDK_DISABLED:
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(
+        BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(tracer_provider)
+    metrics.set_meter_provider(MeterProvider(
+        metric_readers=[PeriodicExportingMetricReader(OTLPMetricExporter())]))
+    FlaskInstrumentor().instrument_app(app)
+    BotocoreInstrumentor().instrument()
 
 
 @app.before_request
 def before_request():
     """log http request (except for health checks)"""
+    timing.start_request()
+    profiler.set_route(f"{request.method} {request.url_rule or request.path}")
     if request.path != "/health":
         logging.info(f"HTTP {request.method} {request.url}")
 
@@ -48,11 +66,89 @@ def after_request(response):
     if request.path != "/health":
         logging.info(
             f"HTTP {request.method} {request.url} {response.status_code}")
+        server_timing = timing.server_timing_header()
+        if server_timing:
+            response.headers["Server-Timing"] = server_timing
     return response
 
 
+@app.teardown_request
+def teardown_request(exception):
+    profiler.clear_route()
+
+
+@app.after_request
+def compress(response):
+    """gzip large responses for clients that accept it"""
+    if (response.status_code not in (200, 304)
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers):
+        return response
+
+    # whether or not this client gets gzip, the response varies on it,
+    # so caches must not hand this copy to clients with other encodings
+    response.vary.add("Accept-Encoding")
+    if response.status_code != 200 or not request.accept_encodings["gzip"]:
+        return response
+
+    data = response.get_data()
+    if len(data) < Config.COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def templates_version():
+    """hash of the templates so that etags change when the markup does"""
+    h = hashlib.sha1()
+    folder = os.path.join(app.root_path, app.template_folder)
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+
+render_version = templates_version()
+
+
+def conditional(version, build):
+    """
+    returns a 304 if the client already has this version of the resource,
+    otherwise renders the response (or fetches it from the cache, since
+    the etag identifies its content) and tags it with an etag
+    """
+    etag = hashlib.sha1(
+        f"{render_version}:{request.path}:{version}".encode()).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(app_cache.get_or_load("render", etag, build))
+    response.set_etag(etag, weak=True)
+    response.cache_control.no_cache = True
+    return response
+
+
+def history_version(chat_history):
+    """version of a user's chat history derived from its content"""
+    return hashlib.sha1(json.dumps(chat_history).encode()).hexdigest()
+
+
+# shared cache for conversations, history and rendered fragments
+app_cache = cache.create(Config)
+
 # initialize database client
-db = database.Database()
+db = database.Database(app_cache)
+
+# de-duplicates repeated asks (double submits, client retries)
+asks = idempotency.Store(Config.IDEMPOTENCY_WINDOW)
+
+# optional always-on low rate profiler
+continuous_profiler = None
+if Config.PROFILE_CONTINUOUS_INTERVAL > 0:
+    continuous_profiler = profiler.Sampler(
+        Config.PROFILE_CONTINUOUS_INTERVAL).start()
 
 
 @app.template_filter('markdown')
@@ -64,7 +160,23 @@ def render_markdown(text):
     )
 
     # Render the markdown as-is - let mistune handle proper formatting
-    return Markup(renderer(text))
+    with timing.stage("markdown", span=False):
+        return Markup(renderer(text))
+
+
+def render(template_name, **context):
+    """render a template, timed as a stage (includes markdown rendering)"""
+    with timing.stage("template"):
+        return render_template(template_name, **context)
+
+
+@app.context_processor
+def inject_idempotency_key():
+    """
+    a fresh key per render, so a double submitted form replays the first
+    answer while the next question from the re-rendered form is a new ask
+    """
+    return {"idempotency_key": str(uuid.uuid4())}
 
 
 @app.route("/health")
@@ -72,12 +184,57 @@ def health_check():
     return "healthy"
 
 
+@app.route("/debug/profile")
+def debug_profile():
+    """
+    GET /debug/profile?seconds=10&interval=0.01 samples all threads for
+    a number of seconds and returns a collapsed stack profile.
+    GET /debug/profile?mode=continuous returns (and resets) the profile
+    collected by the always-on profiler.
+    """
+    if not profiler.authorized(Config.PROFILE_TOKEN,
+                               request.headers.get("X-Debug-Token")):
+        abort(403)
+
+    if request.args.get("mode") == "continuous":
+        if continuous_profiler is None:
+            abort(404, "continuous profiling is not enabled")
+        result = continuous_profiler.collapsed(reset=True)
+    else:
+        try:
+            seconds = profiler.parse_duration(
+                request.args.get("seconds"), 10, 0.1, 60)
+            interval = profiler.parse_duration(
+                request.args.get("interval"), 0.01, 0.001, 1)
+        except ValueError as e:
+            abort(400, str(e))
+        result = profiler.profile(seconds, interval)
+
+    return result, 200, {"Content-Type": "text/plain"}
+
+
 def get_current_user_id():
     """get the currently logged in user"""
     # TODO: get current user id from auth
     return "user-1"
 
 
+def get_idempotency_key(user_id, conversation_id, question):
+    """
+    uses the client supplied Idempotency-Key header if present, otherwise
+    derives a key from the conversation and question. a client key is
+    bound to the conversation and question too, so reusing it for a
+    different ask runs that ask instead of replaying another answer.
+    returns (key, window)
+    """
+    key = request.headers.get("Idempotency-Key")
+    if key:
+        return (idempotency.derive_key(user_id, key, conversation_id, question),
+                Config.IDEMPOTENCY_WINDOW)
+    return (idempotency.derive_key(user_id, conversation_id, question),
+            Config.IDEMPOTENCY_DERIVED_WINDOW)
+
+
 def get_chat_history(user_id):
     """
     fetches the user's latest chat history
@@ -91,20 +248,22 @@ def get_chat_history(user_id):
 @app.route("/")
 def index():
     """home page"""
-    return render_template("index.html", conversation={})
+    return render("index.html", conversation={})
 
 
 @app.route("/new", methods=["POST"])
 def new():
     """POST /new starts a new conversation"""
-    return render_template("chat.html", conversation={})
+    return render("chat.html", conversation={})
 
 
 @app.route("/conversations")
 def conversations():
     """GET /conversations returns just the conversation history"""
     user_id = get_current_user_id()
-    return render_template("conversations.html", chat_history=get_chat_history(user_id))
+    chat_history = get_chat_history(user_id)
+    return conditional(history_version(chat_history),
+                       lambda: render("conversations.html", chat_history=chat_history))
 
 
 @app.route("/ask", methods=["POST"])
@@ -129,6 +288,7 @@ def ask():
     logging.info(f"id: {id}")
 
     user_id = get_current_user_id()
+    key, window = get_idempotency_key(user_id, id, question)
 
     is_new_conversation = (id == "")
     if is_new_conversation:
@@ -140,12 +300,19 @@ def ask():
         "questions": [],
     }
 
-    _, conversation, sources = ask_internal(conversation, question)
+    _, conversation, sources = ask_internal(
+        conversation, question, key, window)
+
+    # a duplicate ask returns the original (possibly new) conversation,
+    # which is already in the history, so it isn't added again
+    if conversation["conversationId"] != id:
+        id = conversation["conversationId"]
+        is_new_conversation = False
 
     # Only render the chat content, not the entire body
-    response = render_template("chat.html",
-                               conversation=conversation,
-                               sources=sources)
+    response = render("chat.html",
+                      conversation=conversation,
+                      sources=sources)
 
     # If this is a new conversation, also update the conversation history
     if is_new_conversation:
@@ -167,7 +334,7 @@ def ask():
             "initial_question": question,
             "created": current_datetime,
         }
-        conversation_item = render_template(
+        conversation_item = render(
             "conversation_item.html", item=new_history_item)
 
         # Use out-of-band swap to prepend to conversation list
@@ -176,28 +343,33 @@ def ask():
     return response
 
 
-def ask_internal(conversation, question):
+def ask_internal(conversation, question, key, window):
     """
     core ask implementation shared by app and api.
+    duplicate asks with the same idempotency key share a single agent
+    invocation and answer. only the answer is stored for replay, the
+    conversation is always fetched as it is now.
     """
+    conversation_id, answer, sources = asks.do(
+        key, ask_agent, conversation, question, window=window)
+
+    # fetch latest conversation
+    conversation = db.get(conversation_id, conversation["userId"])
+
+    return answer, conversation, sources
+
+
+def ask_agent(conversation, question):
+    """invokes the agent, returns (conversation id, answer, sources)"""
 
     # RAG orchestration to get answer
     answer, sources = orchestrator.orchestrate(conversation, question)
 
     conversation_id = conversation["conversationId"]
-    user_id = conversation["userId"]
-
-    # fetch latest conversation
-    conversation = db.get(conversation_id, user_id)
+    db.invalidate(conversation_id, conversation["userId"])
     sources = []
 
-    return answer, conversation, sources
-
-
-if __name__ == '__main__':
-    port = 8080
-    print(f"listening on http://localhost:{port}")
-    app.run(host="0.0.0.0", port=port)
+    return conversation_id, answer, sources
 
 
 @app.route("/conversation/<id>", methods=["GET"])
@@ -206,7 +378,8 @@ def get_conversation(id):
 
     user_id = get_current_user_id()
     conversation = db.get(id, user_id)
-    return render_template("chat.html", conversation=conversation)
+    return conditional(conversation["version"],
+                       lambda: render("chat.html", conversation=conversation))
 
 
 @app.route("/api/ask", methods=["POST"])
@@ -222,13 +395,17 @@ def ask_api_new():
         abort(400, m)
     question = body["question"]
 
+    user_id = get_current_user_id()
+    key, window = get_idempotency_key(user_id, "", question)
+
     conversation = {
         "conversationId": str(uuid.uuid4()),
         "userId": user_id,
         "questions": [],
     }
 
-    answer, conversation, sources = ask_internal(conversation, question)
+    answer, conversation, sources = ask_internal(
+        conversation, question, key, window)
 
     return {
         "conversationId": conversation["conversationId"],
@@ -256,12 +433,15 @@ def ask_api(id):
         m = "conversation id is required"
         logging.error(m)
         abort(400, m)
-    else:
-        conversation = db.get(id, user_id)
-        logging.info("fetched conversation")
-        log.debug(conversation)
 
-    answer, _, sources = ask_internal(conversation, question)
+    key, window = get_idempotency_key(user_id, id, question)
+    conversation = {
+        "conversationId": id,
+        "userId": user_id,
+        "questions": [],
+    }
+
+    answer, _, sources = ask_internal(conversation, question, key, window)
 
     return {
         "conversationId": id,
@@ -273,4 +453,11 @@ def ask_api(id):
 @app.route("/api/conversations/users/<user_id>")
 def conversations_get_by_user(user_id):
     """fetch top 10 conversations for a user"""
-    return db.list_by_user(user_id, 10)
+    chat_history = db.list_by_user(user_id, 10)
+    return conditional(history_version(chat_history), lambda: chat_history)
+
+
+if __name__ == '__main__':
+    port = 8080
+    print(f"listening on http://localhost:{port}")
+    app.run(host="0.0.0.0", port=port)
@@ -3,6 +3,7 @@ import json
 import logging
 import log
 import boto3
+import timing
 from config import Config
 from chat_message import ChatMessage
 
@@ -32,7 +33,8 @@ def orchestrate(conversation_history, new_question):
     log.info(request)
 
     # Call invoke_agent_runtime
-    response = runtime.invoke_agent_runtime(**request)
+    with timing.stage("agent_invoke"):
+        response = runtime.invoke_agent_runtime(**request)
 
     # Handle the response
     status_code = response["statusCode"]
@@ -41,8 +43,10 @@ def orchestrate(conversation_history, new_question):
         raise Exception(f"Agent runtime returned an http {status_code}")
 
     # The response body is a StreamingBody object
-    response_body = response["response"].read().decode("utf-8")
-    logging.info(f"Response Body: {response_body}")
+    with timing.stage("agent_decode"):
+        response_body = response["response"].read().decode("utf-8")
+        logging.info("Response Body: %s", response_body)
+        msg = ChatMessage.from_json(response_body)
+        answer = msg.get_text_content()
 
-    msg = ChatMessage.from_json(response_body)
-    return msg.get_text_content(), []
+    return answer, []
@@ -0,0 +1,81 @@
+import threading
+from opentelemetry import metrics
+
+meter = metrics.get_meter(__name__)
+coalesced_calls = meter.create_counter(
+    "app.singleflight.coalesced",
+    description="calls that were served by another in-flight call",
+)
+
+
+class Call():
+    """an in-flight (or completed) function call shared by callers"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Group():
+    """
+    Coalesces concurrent calls with the same key so that only one of them
+    executes the function while the others wait for and share its result.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """executes fn once for all concurrent callers with the same key"""
+
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = Call()
+                self.calls[key] = call
+                leader = True
+
+        if not leader:
+            coalesced_calls.add(1, {"group": self.name})
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            # followers must never mistake a failed call for a None result.
+            # errors that aren't Exceptions (e.g. SystemExit) are meant for
+            # the leader's thread only, so followers get a plain error
+            if isinstance(e, Exception):
+                call.error = e
+            else:
+                call.error = Exception(
+                    f"{self.name} call interrupted by {type(e).__name__}")
+            raise
+        finally:
+            with self.lock:
+                # a forgotten key may already belong to a newer call
+                if self.calls.get(key) is call:
+                    del self.calls[key]
+            call.done.set()
+
+        return call.result
+
+    def forget_matching(self, predicate):
+        """
+        forget all in-flight calls whose keys match a predicate, so that
+        subsequent callers start new ones (e.g., after a write that the
+        in-flight calls may not have observed)
+        """
+        with self.lock:
+            for key in [k for k in self.calls if predicate(k)]:
+                del self.calls[key]
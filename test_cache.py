@@ -0,0 +1,96 @@
+import os
+import time
+import tempfile
+import threading
+import unittest
+import cache
+from singleflight import Group
+
+
+class FailingCache(cache.MemoryCache):
+    """a backend that is down"""
+
+    def load(self, key):
+        raise ConnectionError("backend down")
+
+    def store(self, key, value, ttl):
+        raise ConnectionError("backend down")
+
+    def counter(self, key):
+        raise ConnectionError("backend down")
+
+    def increment(self, key):
+        raise ConnectionError("backend down")
+
+
+class TestCache(unittest.TestCase):
+
+    def test_invalidate_during_load(self):
+        c = cache.MemoryCache(60, 100)
+
+        def load_and_invalidate():
+            c.invalidate("ns")
+            return "stale"
+
+        self.assertEqual(c.get_or_load("ns", "k", load_and_invalidate), "stale")
+        self.assertEqual(c.get_or_load("ns", "k", lambda: "fresh"), "fresh")
+
+    def test_load_after_invalidate_does_not_join_earlier_flight(self):
+        c = cache.MemoryCache(60, 100)
+        flight = Group("test")
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait()
+            return "stale"
+
+        results = []
+        t = threading.Thread(target=lambda: results.append(
+            c.get_or_load("ns", "k", slow, flight=flight)))
+        t.start()
+        started.wait()
+        c.invalidate("ns")
+        fresh = c.get_or_load("ns", "k", lambda: "fresh", flight=flight)
+        release.set()
+        t.join()
+
+        self.assertEqual(fresh, "fresh")
+        self.assertEqual(results, ["stale"])
+        self.assertEqual(c.get_or_load("ns", "k", lambda: "other"), "fresh")
+
+    def test_counter_eviction(self):
+        c = cache.MemoryCache(60, 2)
+        c.get_or_load("a", "k", lambda: "old")
+        c.invalidate("a")
+        c.invalidate("b")
+        c.invalidate("c")
+
+        self.assertLessEqual(len(c.counters), 2)
+        self.assertNotIn("version:a", c.counters)
+        # the evicted namespace never reads an older version
+        self.assertEqual(c.get_or_load("a", "k", lambda: "new"), "new")
+
+    def test_backend_error_falls_back_to_loader(self):
+        c = FailingCache(60, 100)
+        self.assertEqual(c.get_or_load("ns", "k", lambda: "value"), "value")
+        c.invalidate("ns")
+        self.assertEqual(c.errors, 2)
+
+    def test_disk_counters_expire(self):
+        with tempfile.TemporaryDirectory() as d:
+            c = cache.DiskCache(0.05, 1, os.path.join(d, "cache.db"))
+            c.invalidate("a")
+            c.invalidate("b")
+            # counters don't count towards max_entries
+            self.assertEqual((c.version("a"), c.version("b")), (1, 1))
+            time.sleep(0.15)
+            self.assertEqual(c.version("a"), 0)
+            c.store("k", "v", c.ttl)
+            count = c.connection().execute(
+                "SELECT count(*) FROM counters").fetchone()[0]
+            self.assertEqual(count, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
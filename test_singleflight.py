@@ -0,0 +1,65 @@
+import time
+import threading
+import unittest
+from singleflight import Group
+
+
+class TestGroup(unittest.TestCase):
+
+    def run_concurrently(self, group, fn, followers=3):
+        """runs fn through the group from a leader and several followers"""
+        started, release = threading.Event(), threading.Event()
+
+        def leader_fn():
+            started.set()
+            release.wait()
+            return fn()
+
+        results = []
+
+        def call(f):
+            try:
+                results.append(group.do("k", f))
+            except BaseException as e:
+                results.append(e)
+
+        leader = threading.Thread(target=call, args=(leader_fn,))
+        leader.start()
+        started.wait()
+        threads = [threading.Thread(target=call, args=(fn,))
+                   for _ in range(followers)]
+        for t in threads:
+            t.start()
+        while group.coalesced < followers:
+            time.sleep(0.001)
+        release.set()
+        for t in [leader] + threads:
+            t.join()
+        return results
+
+    def test_coalesces_concurrent_calls(self):
+        calls = []
+        group = Group("test")
+        results = self.run_concurrently(group, lambda: calls.append(1) or "v")
+        self.assertEqual(results, ["v"] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_followers_get_leader_error(self):
+        def fail():
+            raise ValueError("failed")
+        results = self.run_concurrently(Group("test"), fail)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+
+    def test_followers_never_get_none_for_base_exception(self):
+        def interrupt():
+            raise KeyboardInterrupt()
+        results = self.run_concurrently(Group("test"), interrupt)
+        self.assertEqual(
+            sum(isinstance(r, KeyboardInterrupt) for r in results), 1)
+        self.assertTrue(all(isinstance(r, Exception) for r in results
+                            if not isinstance(r, KeyboardInterrupt)))
+        self.assertEqual(len(results), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import time
+import contextvars
+from contextlib import contextmanager
+from opentelemetry import trace, metrics
+
+tracer = trace.get_tracer(__name__)
+meter = metrics.get_meter(__name__)
+stage_duration = meter.create_histogram(
+    "app.stage.duration",
+    unit="ms",
+    description="time spent in each stage of handling a request",
+)
+
+# stage name -> total milliseconds for the current request
+stages = contextvars.ContextVar("stages", default=None)
+
+
+def start_request():
+    """starts collecting stage timings for a new request"""
+    stages.set({})
+
+
+@contextmanager
+def stage(name, span=True):
+    """
+    times a block of code as a named stage, recording it as a span,
+    a histogram measurement and a Server-Timing entry.
+    use span=False for stages that run many times per request.
+    """
+    start = time.perf_counter()
+    try:
+        if span:
+            with tracer.start_as_current_span(name):
+                yield
+        else:
+            yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        stage_duration.record(elapsed, {"stage": name})
+        timings = stages.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0) + elapsed
+
+
+def server_timing_header():
+    """returns a Server-Timing header value for the current request"""
+    timings = stages.get() or {}
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in timings.items())